@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Shared AWS Clients
+One client configuration and client cache for the recovery tools
+"""
+
+import functools
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+
+# Adaptive retries back off on throttling and 503s with a client-side token
+# bucket; the pool is large enough for the recovery and applier thread pools
+AWS_CLIENT_CONFIG = Config(
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    max_pool_connections=128,
+    tcp_keepalive=True
+)
+
+# One session per process; clients are memoized per (service, region) so
+# repeated managers and appliers do not re-load service models and credentials
+_SESSION = boto3.session.Session()
+
+@functools.lru_cache(maxsize=None)
+def get_client(service: str, region: Optional[str] = None):
+    """Return the shared client for service/region"""
+    return _SESSION.client(service, region_name=region, config=AWS_CLIENT_CONFIG)
+
+def get_resource(service: str, region: Optional[str] = None):
+    """Return a new resource for service/region using the shared config"""
+    # Resources are not thread-safe, so they are not shared between callers
+    return _SESSION.resource(service, region_name=region, config=AWS_CLIENT_CONFIG)
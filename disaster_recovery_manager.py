@@ -4,31 +4,114 @@ Disaster Recovery Manager
 Implements complete recovery workflow with full + incremental backup
 """
 
-import boto3
 import json
 import os
 import logging
-from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, List, Optional, Tuple
 import time
+import random
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from aws_clients import get_client
+
+logger = logging.getLogger(__name__)
+
+# Backup buckets already validated in this process
+_VALIDATED_BUCKETS = set()
+
+# Concurrent GETs used when scanning backup metadata
+METADATA_FETCH_WORKERS = 32
+
+# Allowed clock difference between the backup writer and S3 when using an
+# object's LastModified as an upper bound for its export_time
+METADATA_CLOCK_SKEW = timedelta(minutes=5)
+
+# Change files written by the stream Lambda:
+# ddb-changes/ddb_changes_YYYYMMDD_HHMMSS_ffffff.json[.gz] (UTC)
+CHANGE_FILE_PREFIX = "ddb-changes/"
+CHANGE_FILE_KEY_PREFIX = f"{CHANGE_FILE_PREFIX}ddb_changes_"
+CHANGE_FILE_TIME_FORMAT = '%Y%m%d_%H%M%S'
+# JSON array files, and NDJSON; either may be gzip-compressed
+CHANGE_FILE_SUFFIXES = ('.json', '.json.gz', '.ndjson', '.ndjson.gz')
+
+# Concurrent per-day LIST streams when discovering change files
+CHANGE_LIST_WORKERS = 16
+
+# Change files downloaded ahead of the one being applied. Files are small
+# (one stream batch each) and a window spans many of them, so reads need
+# enough concurrency to keep the writers busy
+CHANGE_FILE_PREFETCH = 16
+
+# Consecutive change files are applied together until about this many
+# records are buffered, so writes can run in parallel across files
+CHANGE_APPLY_WINDOW_RECORDS = 10000
+
+# describe_import polling backoff and overall import timeout (seconds)
+IMPORT_POLL_INITIAL_DELAY = 2
+IMPORT_POLL_MAX_DELAY = 60
+IMPORT_TIMEOUT = 3600
+
+# Read capacity of a table created with provisioned write capacity
+IMPORT_PROVISIONED_RCU = 5
+
+def _parse_backup_time(value: str) -> datetime:
+    """Parse a backup timestamp: YYYYMMDD_HHMMSS (UTC) or ISO-8601"""
+    if _is_change_file_time(value):
+        return datetime.strptime(value, CHANGE_FILE_TIME_FORMAT).replace(tzinfo=timezone.utc)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def _is_change_file_time(value: str) -> bool:
+    """Check for a YYYYMMDD_HHMMSS slice taken from a change file key"""
+    return (len(value) == 15 and value[8] == '_'
+            and value[:8].isdigit() and value[9:].isdigit())
 
 class DisasterRecoveryManager:
-    def __init__(self, source_region: str, target_region: str, backup_bucket: str):
+    def __init__(self, source_region: str, target_region: str, backup_bucket: str,
+                 validate_bucket: bool = True, import_timeout: int = IMPORT_TIMEOUT,
+                 import_poll_interval: float = IMPORT_POLL_INITIAL_DELAY, import_wcu: Optional[int] = None):
         self.source_region = source_region
         self.target_region = target_region
         self.backup_bucket = backup_bucket
-        self.ddb_source = boto3.client('dynamodb', region_name=source_region)
-        self.ddb_target = boto3.client('dynamodb', region_name=target_region)
-        self.s3_client = boto3.client('s3')
-        self.logger = None  # Will be initialized in full_disaster_recovery
+        self.import_timeout = import_timeout
+        self.import_poll_interval = import_poll_interval
+        # Provisioned WCU for the restored table while changes are replayed;
+        # None keeps the table on-demand throughout
+        self.import_wcu = import_wcu
+        # Source table schemas (AttributeDefinitions, KeySchema) by table
+        # name; reset at the start of each disaster recovery workflow
+        self._schema_cache = {}
+        self.ddb_source = get_client('dynamodb', source_region)
+        self.ddb_target = get_client('dynamodb', target_region)
+        self.s3_client = get_client('s3')
+        self.logger = logger  # Replaced with a file-backed logger in full_disaster_recovery
         
-        # Validate backup bucket exists
+        # Validate backup bucket exists (once per process per bucket)
+        if validate_bucket and backup_bucket not in _VALIDATED_BUCKETS:
+            self._validate_backup_bucket()
+    
+    def _validate_backup_bucket(self):
+        """HeadBucket check; a denied HeadBucket is not treated as fatal"""
         try:
-            self.s3_client.head_bucket(Bucket=backup_bucket)
-        except self.s3_client.exceptions.NoSuchBucket:
-            raise ValueError(f"❌ Backup bucket '{backup_bucket}' does not exist")
+            self.s3_client.head_bucket(Bucket=self.backup_bucket)
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code in ('403', 'AccessDenied'):
+                # Some policies deny HeadBucket but allow GetObject/ListBucket
+                logger.warning("⚠️ HeadBucket denied for '%s', skipping validation", self.backup_bucket)
+                return
+            if error_code in ('404', 'NoSuchBucket'):
+                raise ValueError(f"❌ Backup bucket '{self.backup_bucket}' does not exist")
+            raise ValueError(f"❌ Cannot access backup bucket '{self.backup_bucket}': {e}")
         except Exception as e:
-            raise ValueError(f"❌ Cannot access backup bucket '{backup_bucket}': {e}")
+            raise ValueError(f"❌ Cannot access backup bucket '{self.backup_bucket}': {e}")
+        
+        _VALIDATED_BUCKETS.add(self.backup_bucket)
     
     def _setup_logger(self, log_filename: str):
         """Setup unified logger for disaster recovery"""
@@ -47,6 +130,112 @@ class DisasterRecoveryManager:
             console_handler.setFormatter(formatter)
             self.logger.addHandler(console_handler)
     
+    def _list_objects(self, prefix: str, start_after: Optional[str] = None) -> List[Dict]:
+        """List all objects under prefix, following list_objects_v2 pagination"""
+        params = {'Bucket': self.backup_bucket, 'Prefix': prefix}
+        if start_after:
+            params['StartAfter'] = start_after
+        
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        objects = []
+        for page in paginator.paginate(**params, PaginationConfig={'PageSize': 1000}):
+            objects.extend(page.get('Contents', []))
+        return objects
+    
+    def _list_change_files(self, start_time: datetime) -> List[Dict]:
+        """List change files from start_time onwards, one LIST stream per day
+        
+        Keys embed a sortable UTC YYYYMMDD_HHMMSS timestamp, so StartAfter lets
+        S3 skip older files, and each day's key range can be paginated
+        concurrently instead of walking the whole window serially.
+        """
+        start_utc = start_time.astimezone(timezone.utc)
+        start_after = f"{CHANGE_FILE_KEY_PREFIX}{start_utc.strftime(CHANGE_FILE_TIME_FORMAT)}"
+        
+        first_day = start_utc.date()
+        last_day = max(first_day, datetime.now(timezone.utc).date())
+        days = [first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+        
+        ranges = [(f"{CHANGE_FILE_KEY_PREFIX}{day.strftime('%Y%m%d')}", None) for day in days]
+        ranges[0] = (ranges[0][0], start_after)
+        # Anything sorting after the last day (clock skew, other key names)
+        ranges.append((CHANGE_FILE_PREFIX, f"{CHANGE_FILE_KEY_PREFIX}{last_day.strftime('%Y%m%d')}~"))
+        
+        with ThreadPoolExecutor(max_workers=min(len(ranges), CHANGE_LIST_WORKERS)) as executor:
+            pages = executor.map(lambda r: self._list_objects(r[0], start_after=r[1]), ranges)
+            return [obj for page in pages for obj in page]
+    
+    def _read_backup_metadata(self, key: str) -> Optional[Dict]:
+        """Read one backup metadata file, returning None if it is invalid"""
+        try:
+            metadata_obj = self.s3_client.get_object(
+                Bucket=self.backup_bucket,
+                Key=key
+            )
+            metadata = json.load(metadata_obj['Body'])
+            _parse_backup_time(metadata['export_time'])  # Must be present and parseable
+            return metadata
+        except Exception:
+            self.logger.warning("⚠️ Skip invalid backup metadata: %s", key)
+            return None
+    
+    def _get_latest_pointer(self, table_name: str) -> Optional[Dict]:
+        """Read backup-metadata/{table}/LATEST.json, None if not maintained"""
+        try:
+            metadata_obj = self.s3_client.get_object(
+                Bucket=self.backup_bucket,
+                Key=f"backup-metadata/{table_name}/LATEST.json"
+            )
+        except ClientError:
+            # Missing (or unreadable) pointer - fall back to listing
+            return None
+        try:
+            metadata = json.load(metadata_obj['Body'])
+            _parse_backup_time(metadata['export_time'])  # Must be present and parseable
+            return metadata
+        except (ValueError, KeyError, TypeError):
+            self.logger.warning("⚠️ Invalid LATEST.json for %s, falling back to listing", table_name)
+            return None
+    
+    def _find_backup_in_index(self, table_name: str, cutoff: datetime) -> Optional[Dict]:
+        """Pick the latest backup not after cutoff from INDEX.jsonl
+        
+        Index lines hold the full backup metadata plus its key; older lines
+        with only {export_time, key} are resolved with one more GET.
+        """
+        try:
+            index_obj = self.s3_client.get_object(
+                Bucket=self.backup_bucket,
+                Key=f"backup-metadata/{table_name}/INDEX.jsonl"
+            )
+        except ClientError:
+            return None
+        
+        latest_entry, latest_time = None, None
+        try:
+            # Consume the index line by line rather than buffering the whole object
+            for line in index_obj['Body'].iter_lines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry_time = _parse_backup_time(entry['export_time'])
+                if entry_time > cutoff:
+                    continue
+                if latest_entry is None or entry_time > latest_time:
+                    latest_entry, latest_time = entry, entry_time
+        except (ValueError, KeyError, TypeError):
+            # A bad line may hide the backup we want - let the listing decide
+            self.logger.warning("⚠️ Invalid INDEX.jsonl for %s, falling back to listing", table_name)
+            return None
+        
+        if latest_entry is None:
+            return None
+        if 'export_arn' in latest_entry and 's3_path' in latest_entry:
+            # Denormalized entry carries the full metadata - no second GET
+            latest_entry.pop('key', None)
+            return latest_entry
+        return self._read_backup_metadata(latest_entry['key'])
+    
     def find_latest_full_backup(self, table_name: str, before_time: Optional[str] = None, 
                                backup_dir: Optional[str] = None) -> Optional[Dict]:
         """Find the latest full backup or use specified backup directory"""
@@ -55,47 +244,64 @@ class DisasterRecoveryManager:
             if backup_dir:
                 return self._load_backup_from_dir(table_name, backup_dir)
             
+            # Parse the cutoff once; export_time values are compared as datetimes
+            # because metadata may use YYYYMMDD_HHMMSS or ISO-8601
+            cutoff = _parse_backup_time(before_time) if before_time else None
+            
+            # Fast path: pointer/index objects maintained by the backup scheduler
+            if cutoff:
+                latest = self._find_backup_in_index(table_name, cutoff)
+            else:
+                latest = self._get_latest_pointer(table_name)
+            if latest:
+                self.logger.info("📦 Found latest full backup: %s", latest['export_time'])
+                return latest
+            
             prefix = f"backup-metadata/{table_name}/"
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.backup_bucket,
-                Prefix=prefix
-            )
+            objects = self._list_objects(prefix)
             
-            if 'Contents' not in response:
-                print(f"❌ No backup metadata found for table {table_name}")
+            if not objects:
+                self.logger.error("❌ No backup metadata found for table %s", table_name)
                 return None
             
-            backups = []
-            for obj in response['Contents']:
-                if obj['Key'].endswith('.json'):
-                    try:
-                        metadata_obj = self.s3_client.get_object(
-                            Bucket=self.backup_bucket,
-                            Key=obj['Key']
-                        )
-                        metadata = json.loads(metadata_obj['Body'].read())
+            # Metadata is written after its export is requested, so an object's
+            # LastModified bounds its export_time. Fetch newest-first in
+            # concurrent waves (each GET is tiny and latency-bound) and stop once
+            # no remaining object can hold a later backup than the best so far
+            candidates = sorted((obj for obj in objects
+                                 if obj['Key'].endswith('.json') and obj['Key'] != f"{prefix}LATEST.json"),
+                                key=lambda obj: obj['LastModified'], reverse=True)
+            # Keep a running max as results arrive instead of collecting and
+            # sorting them; each export_time is parsed only once
+            latest, latest_time = None, None
+            with ThreadPoolExecutor(max_workers=max(1, min(len(candidates), METADATA_FETCH_WORKERS))) as executor:
+                for start in range(0, len(candidates), METADATA_FETCH_WORKERS):
+                    wave = candidates[start:start + METADATA_FETCH_WORKERS]
+                    for metadata in executor.map(self._read_backup_metadata, [obj['Key'] for obj in wave]):
+                        if metadata is None:
+                            continue
                         
                         # Check if before specified time
-                        if before_time and metadata['export_time'] > before_time:
+                        export_time = _parse_backup_time(metadata['export_time'])
+                        if cutoff and export_time > cutoff:
                             continue
-                            
-                        backups.append(metadata)
-                    except Exception as e:
-                        print(f"⚠️ Skip invalid backup metadata: {obj['Key']}")
+                        
+                        if latest_time is None or export_time > latest_time:
+                            latest, latest_time = metadata, export_time
+                    
+                    remaining = candidates[start + METADATA_FETCH_WORKERS:]
+                    if latest_time and remaining and latest_time > remaining[0]['LastModified'] + METADATA_CLOCK_SKEW:
+                        break
             
-            if not backups:
-                self.logger.info("❌ No backup metadata found") if self.logger else print("❌ No backup metadata found")
+            if latest is None:
+                self.logger.info("❌ No backup metadata found")
                 return None
                 
-            # Sort by time, return latest
-            latest = sorted(backups, key=lambda x: x['export_time'], reverse=True)[0]
-            msg = f"📦 Found latest full backup: {latest['export_time']}"
-            self.logger.info(msg) if self.logger else print(msg)
+            self.logger.info("📦 Found latest full backup: %s", latest['export_time'])
             return latest
             
         except Exception as e:
-            msg = f"❌ Failed to find full backup: {e}"
-            self.logger.error(msg) if self.logger else print(msg)
+            self.logger.error("❌ Failed to find full backup: %s", e)
             return None
     
     def _load_backup_from_dir(self, table_name: str, backup_dir: str) -> Optional[Dict]:
@@ -104,46 +310,78 @@ class DisasterRecoveryManager:
             # Construct metadata file path
             metadata_key = f"backup-metadata/{table_name}/{backup_dir}.json"
             
-            msg = f"📂 Using specified full backup directory: {backup_dir}"
-            self.logger.info(msg) if self.logger else print(msg)
+            self.logger.info("📂 Using specified full backup directory: %s", backup_dir)
             
             try:
                 metadata_obj = self.s3_client.get_object(
                     Bucket=self.backup_bucket,
                     Key=metadata_key
                 )
-                metadata = json.loads(metadata_obj['Body'].read())
-                msg = f"✅ Loaded backup metadata: {metadata['export_time']}"
-                self.logger.info(msg) if self.logger else print(msg)
+                metadata = json.load(metadata_obj['Body'])
+                self.logger.info("✅ Loaded backup metadata: %s", metadata['export_time'])
                 return metadata
                 
             except self.s3_client.exceptions.NoSuchKey:
-                msg = f"❌ Backup metadata not found for specified directory: {metadata_key}"
-                self.logger.error(msg) if self.logger else print(msg)
+                self.logger.error("❌ Backup metadata not found for specified directory: %s", metadata_key)
                 return None
                 
         except Exception as e:
-            msg = f"❌ Failed to load specified backup: {e}"
-            self.logger.error(msg) if self.logger else print(msg)
+            self.logger.error("❌ Failed to load specified backup: %s", e)
             return None
     
+    def _describe_source_table(self, table_name: str) -> Tuple[List[Dict], List[Dict]]:
+        """Return (AttributeDefinitions, KeySchema) of a source table, cached per workflow"""
+        if table_name not in self._schema_cache:
+            table = self.ddb_source.describe_table(TableName=table_name)['Table']
+            self._schema_cache[table_name] = (table['AttributeDefinitions'], table['KeySchema'])
+        return self._schema_cache[table_name]
+    
+    def _find_completed_import(self, target_table: str, s3_prefix: str) -> Optional[str]:
+        """Return the ARN of a completed import of s3_prefix that created the current target table"""
+        try:
+            table = self.ddb_target.describe_table(TableName=target_table)['Table']
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ResourceNotFoundException':
+                return None
+            raise
+        
+        params = {'TableArn': table['TableArn']}
+        while True:
+            response = self.ddb_target.list_imports(**params)
+            for summary in response.get('ImportSummaryList', []):
+                source = summary.get('S3BucketSource', {})
+                # An import that ended before the table was created belongs to
+                # an earlier table of the same name
+                if (summary.get('ImportStatus') == 'COMPLETED'
+                        and source.get('S3Bucket') == self.backup_bucket
+                        and source.get('S3KeyPrefix') == s3_prefix
+                        and summary.get('EndTime')
+                        and summary['EndTime'] >= table['CreationDateTime']):
+                    return summary['ImportArn']
+            if 'NextToken' not in response:
+                return None
+            params['NextToken'] = response['NextToken']
+    
     def restore_from_full_backup(self, backup_metadata: Dict, target_table: str) -> bool:
         """Restore from full backup with retry mechanism"""
         from retry_decorator import retry_import_export
         
         @retry_import_export
-        def _start_import():
-            # Get source table schema
-            source_table = backup_metadata['table_name']
-            source_table_info = self.ddb_source.describe_table(TableName=source_table)
-            
-            # Use DynamoDB Import functionality
-            s3_prefix = backup_metadata['s3_path'].replace(f"s3://{self.backup_bucket}/", "")
-            # Add AWSDynamoDB and export ID path
-            export_id = backup_metadata['export_arn'].split('/')[-1]
-            s3_prefix = f"{s3_prefix}AWSDynamoDB/{export_id}/data/"
+        def _start_import(attribute_definitions, key_schema):
+            if self.import_wcu:
+                # Import itself does not consume table capacity; this is sized
+                # for the incremental replay that follows
+                billing = {
+                    'BillingMode': 'PROVISIONED',
+                    'ProvisionedThroughput': {
+                        'ReadCapacityUnits': IMPORT_PROVISIONED_RCU,
+                        'WriteCapacityUnits': self.import_wcu
+                    }
+                }
+            else:
+                billing = {'BillingMode': 'PAY_PER_REQUEST'}
             
-            response = self.ddb_target.import_table(
+            params = dict(
                 S3BucketSource={
                     'S3Bucket': self.backup_bucket,
                     'S3KeyPrefix': s3_prefix
@@ -152,106 +390,138 @@ class DisasterRecoveryManager:
                 InputCompressionType='GZIP',
                 TableCreationParameters={
                     'TableName': target_table,
-                    'AttributeDefinitions': source_table_info['Table']['AttributeDefinitions'],
-                    'KeySchema': source_table_info['Table']['KeySchema'],
-                    'BillingMode': 'PAY_PER_REQUEST'
+                    'AttributeDefinitions': attribute_definitions,
+                    'KeySchema': key_schema,
+                    **billing
                 }
             )
-            return response['ImportTableDescription']['ImportArn']
+            description = self.ddb_target.import_table(ClientToken=client_token, **params)['ImportTableDescription']
+            if description['ImportStatus'] in ('COMPLETED', 'FAILED', 'CANCELLED'):
+                # The token matched an earlier import that has already finished
+                # but whose table is gone (or it failed) - start a fresh one
+                self.logger.info("ℹ️ Previous import %s is %s, starting a new one", description['ImportArn'], description['ImportStatus'])
+                description = self.ddb_target.import_table(**params)['ImportTableDescription']
+            return description['ImportArn']
         
         try:
-            msg = f"🔄 Starting restore from full backup to table: {target_table}"
-            self.logger.info(msg) if self.logger else print(msg)
+            self.logger.info("🔄 Starting restore from full backup to table: %s", target_table)
+            
+            # Use DynamoDB Import functionality
+            s3_prefix = backup_metadata['s3_path'].replace(f"s3://{self.backup_bucket}/", "")
+            # Add AWSDynamoDB and export ID path
+            export_id = backup_metadata['export_arn'].split('/')[-1]
+            s3_prefix = f"{s3_prefix}AWSDynamoDB/{export_id}/data/"
+            # Same export into the same table with the same billing always yields
+            # the same token, so a retried call returns the original import
+            # instead of starting another. Billing is part of the token because
+            # reusing a token with other parameters is rejected as
+            # IdempotentParameterMismatchException
+            client_token = hashlib.sha256(
+                f"{backup_metadata['export_arn']}|{target_table}|{self.import_wcu or 'PAY_PER_REQUEST'}".encode()
+            ).hexdigest()[:36]
+            
+            try:
+                existing_import = self._find_completed_import(target_table, s3_prefix)
+            except Exception as e:
+                self.logger.warning("⚠️ Could not check for an existing import, importing anyway: %s", e)
+                existing_import = None
+            if existing_import:
+                self.logger.info("✅ Backup already imported into %s by %s, skipping import", target_table, existing_import)
+                return True
+            
+            # Source table schema is static, so fetch it once rather than per retry
+            attribute_definitions, key_schema = self._describe_source_table(backup_metadata['table_name'])
             
             # Start Import (with retry)
-            import_arn = _start_import()
-            msg = f"✅ Full restore started: {import_arn}"
-            self.logger.info(msg) if self.logger else print(msg)
-            
-            # Wait for import completion (with retry check)
-            max_wait_time = 3600  # Maximum wait 1 hour
-            check_interval = 30   # Check every 30 seconds
-            elapsed_time = 0
-            
-            while elapsed_time < max_wait_time:
-                try:
-                    status_response = self.ddb_target.describe_import(ImportArn=import_arn)
-                    status = status_response['ImportTableDescription']['ImportStatus']
-                    
-                    if status == 'COMPLETED':
-                        msg = f"✅ Full restore completed"
-                        self.logger.info(msg) if self.logger else print(msg)
-                        return True
-                    elif status == 'FAILED':
-                        failure_code = status_response['ImportTableDescription'].get('FailureCode', 'Unknown')
-                        failure_msg = status_response['ImportTableDescription'].get('FailureMessage', 'Unknown')
-                        msg = f"❌ Full restore failed: {failure_code} - {failure_msg}"
-                        self.logger.error(msg) if self.logger else print(msg)
-                        return False
-                    else:
-                        msg = f"🔄 Full restore in progress: {status}"
-                        self.logger.info(msg) if self.logger else print(msg)
-                        time.sleep(check_interval)
-                        elapsed_time += check_interval
-                        
-                except Exception as e:
-                    msg = f"⚠️ Failed to check Import status, retrying: {e}"
-                    self.logger.warning(msg) if self.logger else print(msg)
-                    time.sleep(check_interval)
-                    elapsed_time += check_interval
-            
-            msg = f"❌ Full restore timeout ({max_wait_time} seconds)"
-            self.logger.error(msg) if self.logger else print(msg)
-            return False
+            import_arn = _start_import(attribute_definitions, key_schema)
+            self.logger.info("✅ Full restore started: %s", import_arn)
+            
+            return self._wait_for_import(import_arn)
             
         except Exception as e:
-            msg = f"❌ Full restore failed: {e}"
-            self.logger.error(msg) if self.logger else print(msg)
+            self.logger.error("❌ Full restore failed: %s", e)
             return False
     
-    def find_incremental_changes(self, export_arn: str) -> List[str]:
+    def _wait_for_import(self, import_arn: str) -> bool:
+        """Wait for an import to reach a terminal state.
+
+        Behaves like a boto3 waiter (success on COMPLETED, failure on FAILED or
+        CANCELLED, transient errors retried) but backs off exponentially with
+        jitter instead of polling at a fixed delay. Progress is logged only
+        when the status changes.
+        """
+        deadline = time.monotonic() + self.import_timeout
+        attempt = 0
+        last_status = None
+        
+        while time.monotonic() < deadline:
+            try:
+                description = self.ddb_target.describe_import(ImportArn=import_arn)['ImportTableDescription']
+                status = description['ImportStatus']
+                
+                if status == 'COMPLETED':
+                    self.logger.info("✅ Full restore completed")
+                    return True
+                elif status in ('FAILED', 'CANCELLED'):
+                    failure_code = description.get('FailureCode', 'Unknown')
+                    failure_msg = description.get('FailureMessage', 'Unknown')
+                    self.logger.error("❌ Full restore %s: %s - %s", status.lower(), failure_code, failure_msg)
+                    return False
+                elif status != last_status:
+                    self.logger.info("🔄 Full restore in progress: %s", status)
+                last_status = status
+                    
+            except Exception as e:
+                self.logger.warning("⚠️ Failed to check Import status, retrying: %s", e)
+            
+            # Exponential backoff with jitter: short imports are detected
+            # quickly, long ones are not polled every few seconds
+            delay = min(IMPORT_POLL_MAX_DELAY, self.import_poll_interval * 1.5 ** attempt)
+            delay += random.uniform(0, delay * 0.1)
+            time.sleep(max(0, min(delay, deadline - time.monotonic())))
+            attempt += 1
+        
+        self.logger.error("❌ Full restore timeout (%s seconds)", self.import_timeout)
+        return False
+    
+    def _replay_window_start(self, backup_metadata: Dict) -> datetime:
+        """Start of the incremental replay window: 60 seconds before export time"""
+        if 'export_time' in backup_metadata:
+            # Recorded when the export was requested - no call to the source
+            # region, which may be unavailable during a disaster
+            export_time = _parse_backup_time(backup_metadata['export_time'])
+        else:
+            # Get export details to find export time
+            export_response = self.ddb_source.describe_export(ExportArn=backup_metadata['export_arn'])
+            export_time = export_response['ExportDescription']['ExportTime']
+            if export_time.tzinfo is None:
+                export_time = export_time.replace(tzinfo=timezone.utc)
+        
+        self.logger.info("📅 Export time: %s", export_time)
+        return export_time - timedelta(seconds=60)
+    
+    def find_incremental_changes(self, backup_metadata: Dict,
+                                 start_time: Optional[datetime] = None) -> List[str]:
         """Find incremental changes starting 60 seconds before export time"""
         try:
-            # Get export details to find export time
-            export_response = self.ddb_source.describe_export(ExportArn=export_arn)
-            export_time_str = export_response['ExportDescription']['ExportTime']
-            
-            # Parse export time and subtract 60 seconds
-            from datetime import datetime, timezone, timedelta
-            
-            # Handle both string and datetime object
-            if isinstance(export_time_str, str):
-                export_time = datetime.fromisoformat(export_time_str.replace('Z', '+00:00'))
-            else:
-                # Already a datetime object
-                export_time = export_time_str
-                if export_time.tzinfo is None:
-                    export_time = export_time.replace(tzinfo=timezone.utc)
-            
-            start_time = export_time - timedelta(seconds=60)
+            if start_time is None:
+                start_time = self._replay_window_start(backup_metadata)
             
-            msg = f"📅 Export time: {export_time}"
-            self.logger.info(msg) if self.logger else print(msg)
-            msg = f"📅 Looking for changes from: {start_time}"
-            self.logger.info(msg) if self.logger else print(msg)
+            self.logger.info("📅 Looking for changes from: %s", start_time)
             
-            # List all change files in ddb-changes/ directory
-            prefix = "ddb-changes/"
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.backup_bucket,
-                Prefix=prefix
-            )
+            prefix = CHANGE_FILE_PREFIX
+            start_key_time = start_time.astimezone(timezone.utc).strftime(CHANGE_FILE_TIME_FORMAT)
+            objects = self._list_change_files(start_time)
             
-            if 'Contents' not in response:
-                msg = f"ℹ️ No change files found in {prefix}"
-                self.logger.info(msg) if self.logger else print(msg)
+            if not objects:
+                self.logger.info("ℹ️ No change files found in %s", prefix)
                 return []
             
             # Filter and sort files by timestamp
             change_files = []
-            for obj in response['Contents']:
+            for obj in objects:
                 file_key = obj['Key']
-                if file_key.endswith('.json'):
+                if file_key.endswith(CHANGE_FILE_SUFFIXES):
                     # Use S3 LastModified time instead of parsing filename
                     # This is more reliable than parsing complex filename timestamps
                     file_time = obj['LastModified']
@@ -260,86 +530,146 @@ class DisasterRecoveryManager:
                     if file_time.tzinfo is None:
                         file_time = file_time.replace(tzinfo=timezone.utc)
                     
-                    # Include files from start_time onwards
-                    if file_time >= start_time:
+                    # Include files from start_time onwards. Standard key names are
+                    # checked with a plain string compare of the embedded timestamp.
+                    key_time = file_key[len(CHANGE_FILE_KEY_PREFIX):len(CHANGE_FILE_KEY_PREFIX) + 15]
+                    if _is_change_file_time(key_time):
+                        in_window = key_time >= start_key_time
+                    else:
+                        in_window = file_time >= start_time
+                    if in_window:
                         change_files.append((file_time, file_key))
             
             # Sort by timestamp and return file keys
             change_files.sort(key=lambda x: x[0])
             sorted_files = [file_key for _, file_key in change_files]
             
-            msg = f"📄 Found {len(sorted_files)} change files to apply"
-            self.logger.info(msg) if self.logger else print(msg)
-            for file_key in sorted_files[:5]:  # Show first 5
-                msg = f"  - {file_key}"
-                self.logger.info(msg) if self.logger else print(msg)
-            if len(sorted_files) > 5:
-                msg = f"  ... and {len(sorted_files) - 5} more files"
-                self.logger.info(msg) if self.logger else print(msg)
+            self.logger.info("📄 Found %s change files to apply", len(sorted_files))
+            if sorted_files and self.logger.isEnabledFor(logging.INFO):
+                # Show first 5 in a single log record
+                preview = [f"  - {file_key}" for file_key in sorted_files[:5]]
+                if len(sorted_files) > 5:
+                    preview.append(f"  ... and {len(sorted_files) - 5} more files")
+                self.logger.info("\n".join(preview))
             
             return sorted_files
             
         except Exception as e:
-            msg = f"❌ Failed to find incremental changes: {e}"
-            self.logger.error(msg) if self.logger else print(msg)
+            self.logger.error("❌ Failed to find incremental changes: %s", e)
             return []
     
-    def apply_incremental_changes(self, change_files: List[str], target_table: str, log_suffix: str) -> bool:
-        """Apply incremental changes using flat structure (all files in ddb-changes/)"""
+    def _read_change_file(self, applier, read_future, file_key: str, min_creation_time: Optional[float]) -> Optional[List]:
+        """Records of a prefetched change file, re-reading it on failure; None if unreadable"""
+        s3_path = f"s3://{self.backup_bucket}/{file_key}"
+        max_file_retries = 3
+        
+        for retry_attempt in range(max_file_retries):
+            try:
+                # Prefetched read first, synchronous re-read on retry
+                if retry_attempt == 0:
+                    return read_future.result()
+                return applier.read_changes_from_s3(s3_path, min_creation_time)
+            except Exception as e:
+                if retry_attempt < max_file_retries - 1:
+                    delay = 2 ** retry_attempt
+                    self.logger.warning("⚠️ File %s read failed, retrying in %ss: %s", file_key, delay, e)
+                    time.sleep(delay)
+                else:
+                    self.logger.error("❌ File %s final failure: %s", file_key, e)
+        return None
+    
+    def _apply_change_window(self, applier, window_files: List[str], records: List) -> bool:
+        """Apply the records of consecutive change files in one pass (with retry)"""
+        if len(window_files) == 1:
+            label = window_files[0]
+        else:
+            label = f"{window_files[0]} .. {window_files[-1].rsplit('/', 1)[-1]}"
+        self.logger.info("🔄 Applying %d change file(s), %d records: %s", len(window_files), len(records), label)
+        
+        # Use enhanced applier (with retry)
+        max_file_retries = 3
+        for retry_attempt in range(max_file_retries):
+            try:
+                if applier.apply_records(records, label):
+                    self.logger.info("✅ Change file(s) applied successfully: %s", label)
+                    return True
+                self.logger.warning("⚠️ Change file application failed: %s", label)
+            except Exception as e:
+                if retry_attempt < max_file_retries - 1:
+                    delay = 2 ** retry_attempt
+                    self.logger.warning("⚠️ File(s) %s processing failed, retrying in %ss: %s", label, delay, e)
+                    time.sleep(delay)
+                else:
+                    self.logger.error("❌ File(s) %s final failure: %s", label, e)
+        return False
+    
+    def apply_incremental_changes(self, change_files: List[str], target_table: str, log_suffix: str,
+                                  since: Optional[datetime] = None) -> bool:
+        """Apply incremental changes using flat structure (all files in ddb-changes/)
+        
+        Records created before `since` are already in the full backup and are
+        dropped right after each file is read.
+        """
         try:
-            msg = "📄 Using enhanced batch applier for flat structure"
-            self.logger.info(msg) if self.logger else print(msg)
+            self.logger.info("📄 Using enhanced batch applier for flat structure")
             from enhanced_batch_applier import EnhancedBatchApplier
             
             # Create single applier instance for all files to share the same log
             log_filename = f"apply_changes_{target_table}_{log_suffix}.log"
             applier = EnhancedBatchApplier(target_table, self.target_region, log_suffix=log_suffix, shared_log_file=log_filename)
+            min_creation_time = since.timestamp() if since else None
             
-            for file_key in change_files:
-                msg = f"🔄 Applying change file: {file_key}"
-                self.logger.info(msg) if self.logger else print(msg)
-                s3_path = f"s3://{self.backup_bucket}/{file_key}"
-                
-                # Use enhanced applier (with retry)
-                max_file_retries = 3
-                file_success = False
+            # Files are read strictly in order (updates to one key can span
+            # files), with the next few downloaded in the background so S3 GET
+            # latency overlaps with DynamoDB writes. Consecutive files are
+            # applied together as one window: the applier shards a window's
+            # records by key, so writes run in parallel across file
+            # boundaries while each item still sees its changes in order
+            with ThreadPoolExecutor(max_workers=max(1, min(len(change_files), CHANGE_FILE_PREFETCH))) as executor:
+                pending = deque()
+                next_index = 0
+                window_files, window_records = [], []
                 
-                for retry_attempt in range(max_file_retries):
-                    try:
-                        success = applier.apply_changes_from_s3(s3_path)
-                        if success:
-                            msg = f"✅ Change file applied successfully: {file_key}"
-                            self.logger.info(msg) if self.logger else print(msg)
-                            file_success = True
-                            break
-                        else:
-                            msg = f"⚠️ Change file application failed: {file_key}"
-                            self.logger.warning(msg) if self.logger else print(msg)
-                            
-                    except Exception as e:
-                        if retry_attempt < max_file_retries - 1:
-                            delay = 2 ** retry_attempt
-                            msg = f"⚠️ File {file_key} processing failed, retrying in {delay}s: {e}"
-                            self.logger.warning(msg) if self.logger else print(msg)
-                            time.sleep(delay)
-                        else:
-                            msg = f"❌ File {file_key} final failure: {e}"
-                            self.logger.error(msg) if self.logger else print(msg)
-                
-                if not file_success:
-                    msg = f"❌ Failed to apply change file: {file_key}"
-                    self.logger.error(msg) if self.logger else print(msg)
-                    return False
+                for position, file_key in enumerate(change_files, 1):
+                    while next_index < len(change_files) and len(pending) <= CHANGE_FILE_PREFETCH:
+                        ahead_path = f"s3://{self.backup_bucket}/{change_files[next_index]}"
+                        pending.append(executor.submit(applier.read_changes_from_s3, ahead_path, min_creation_time))
+                        next_index += 1
+                    read_future = pending.popleft()
                     
-            msg = f"✅ All incremental changes applied"
-            self.logger.info(msg) if self.logger else print(msg)
+                    records = self._read_change_file(applier, read_future, file_key, min_creation_time)
+                    if records is not None:
+                        window_files.append(file_key)
+                        window_records.extend(records)
+                        if len(window_records) < CHANGE_APPLY_WINDOW_RECORDS and position < len(change_files):
+                            continue
+                    
+                    if records is None or not self._apply_change_window(applier, window_files, window_records):
+                        self.logger.error("❌ Failed to apply change file: %s", file_key)
+                        for future in pending:
+                            future.cancel()
+                        return False
+                    window_files, window_records = [], []
+                    
+            self.logger.info("✅ All incremental changes applied")
             return True
             
         except Exception as e:
-            msg = f"❌ Failed to apply incremental changes: {e}"
-            self.logger.error(msg) if self.logger else print(msg)
+            self.logger.error("❌ Failed to apply incremental changes: %s", e)
             return False
     
+    def _switch_to_on_demand(self, target_table: str):
+        """Return a table created with provisioned capacity to on-demand billing"""
+        try:
+            table = self.ddb_target.describe_table(TableName=target_table)['Table']
+            if table.get('BillingModeSummary', {}).get('BillingMode') == 'PAY_PER_REQUEST':
+                return
+            self.ddb_target.update_table(TableName=target_table, BillingMode='PAY_PER_REQUEST')
+            self.logger.info("💳 Switched %s to on-demand billing", target_table)
+        except Exception as e:
+            # The data is restored either way; billing can be changed by hand
+            self.logger.warning("⚠️ Failed to switch %s to on-demand billing: %s", target_table, e)
+    
     def full_disaster_recovery(self, source_table: str, target_table: str, 
                              disaster_time: Optional[str] = None,
                              backup_dir: Optional[str] = None) -> bool:
@@ -351,31 +681,45 @@ class DisasterRecoveryManager:
         
         # Setup unified logger
         self._setup_logger(log_filename)
+        # Schemas are cached for one workflow only, so a later run sees changes
+        self._schema_cache.clear()
         
-        self.logger.info(f"🚨 Starting disaster recovery: {source_table} → {target_table}")
-        self.logger.info(f"📝 Disaster recovery log: {log_filename}")
+        self.logger.info("🚨 Starting disaster recovery: %s → %s", source_table, target_table)
+        self.logger.info("📝 Disaster recovery log: %s", log_filename)
         
         # 1. Find latest full backup or use specified directory
         backup_metadata = self.find_latest_full_backup(source_table, disaster_time, backup_dir)
         if not backup_metadata:
-            self.logger.error(f"❌ No available full backup found")
+            self.logger.error("❌ No available full backup found")
             return False
         
         # 2. Restore from full backup
         if not self.restore_from_full_backup(backup_metadata, target_table):
             return False
         
-        # 3. Find and apply incremental changes
-        change_files = self.find_incremental_changes(backup_metadata['export_arn'])
-        if change_files:
-            if not self.apply_incremental_changes(change_files, target_table, log_suffix):
+        try:
+            # 3. Find and apply incremental changes
+            try:
+                start_time = self._replay_window_start(backup_metadata)
+            except Exception as e:
+                self.logger.error("❌ Failed to determine export time: %s", e)
                 return False
-        else:
-            self.logger.info(f"ℹ️ No incremental changes to apply")
-        
-        self.logger.info(f"🎉 Disaster recovery completed!")
-        self.logger.info(f"📝 Detailed logs available at: {log_filename}")
-        return True
+            
+            change_files = self.find_incremental_changes(backup_metadata, start_time)
+            if change_files:
+                if not self.apply_incremental_changes(change_files, target_table, log_suffix, since=start_time):
+                    return False
+            else:
+                self.logger.info("ℹ️ No incremental changes to apply")
+            
+            self.logger.info("🎉 Disaster recovery completed!")
+            self.logger.info("📝 Detailed logs available at: %s", log_filename)
+            return True
+        finally:
+            # The restored table exists from here on - never leave it on the
+            # temporary provisioned capacity, even if the replay failed
+            if self.import_wcu:
+                self._switch_to_on_demand(target_table)
 
 if __name__ == "__main__":
     import argparse
@@ -388,13 +732,17 @@ if __name__ == "__main__":
     parser.add_argument('--backup-bucket', required=True, help='Backup S3 bucket name')
     parser.add_argument('--disaster-time', help='Disaster time point (YYYYMMDD_HHMMSS)')
     parser.add_argument('--backup-dir', help='Specify full backup directory (e.g.: full_backup_20251220_084513)')
+    parser.add_argument('--import-timeout', type=int, default=IMPORT_TIMEOUT, help='Maximum seconds to wait for the full restore import')
+    parser.add_argument('--import-wcu', type=int, help='Create the target table with this provisioned WCU for the replay, then switch to on-demand')
     
     args = parser.parse_args()
     
     dr_manager = DisasterRecoveryManager(
         args.source_region, 
         args.target_region, 
-        args.backup_bucket
+        args.backup_bucket,
+        import_timeout=args.import_timeout,
+        import_wcu=args.import_wcu
     )
     
     success = dr_manager.full_disaster_recovery(
@@ -3,21 +3,76 @@
 Enhanced Batch Applier with Retry Mechanism
 """
 
-import boto3
+import atexit
+import base64
+import gzip
 import json
 import argparse
 import logging
+import logging.handlers
+import queue
+import random
+import threading
 import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
-from boto3.dynamodb.types import TypeDeserializer
+from aws_clients import get_client, get_resource
 from retry_decorator import retry_dynamodb_operation, retry_s3_operation
 
+# Change files are parsed with orjson when it is installed (several times
+# faster on large DynamoDB JSON payloads); the stdlib parser is the fallback
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# BatchWriteItem accepts at most 25 requests; unprocessed items are resent
+# with jittered exponential backoff before falling back to single-item writes
+BATCH_WRITE_LIMIT = 25
+UNPROCESSED_MAX_RETRIES = 10
+UNPROCESSED_INITIAL_DELAY = 0.05
+UNPROCESSED_MAX_DELAY = 5
+
+# Records are sharded by key across this many concurrent writers
+DEFAULT_WORKERS = 8
+
+def _wire_value(value: dict) -> dict:
+    """Stream attribute value in the form the low-level client expects
+    
+    Stream events carry B/BS values as base64 strings, but botocore
+    base64-encodes binary values itself, so they are decoded to bytes
+    first (also inside M and L). Other types are passed through as-is.
+    """
+    (attr_type, data), = value.items()
+    if attr_type == 'B':
+        return {'B': base64.b64decode(data) if isinstance(data, str) else data}
+    if attr_type == 'BS':
+        return {'BS': [base64.b64decode(v) if isinstance(v, str) else v for v in data]}
+    if attr_type == 'M':
+        return {'M': _wire_image(data)}
+    if attr_type == 'L':
+        return {'L': [_wire_value(v) for v in data]}
+    return value
+
+def _wire_image(image: dict) -> dict:
+    """Stream NewImage/Keys ready to be written with the low-level client"""
+    return {name: _wire_value(value) for name, value in image.items()}
+
 class EnhancedBatchApplier:
-    def __init__(self, target_table_name: str, region: str = 'us-west-2', log_suffix: str = None, shared_log_file: str = None):
+    # (region, table) pairs already verified in this process; appliers built
+    # for the same table skip the DescribeTable round trip
+    _verified_tables = set()
+    
+    def __init__(self, target_table_name: str, region: str = 'us-west-2', log_suffix: str = None, shared_log_file: str = None,
+                 max_workers: int = DEFAULT_WORKERS):
         self.target_table_name = target_table_name
         self.region = region
-        self.deserializer = TypeDeserializer()
+        self.max_workers = max(1, max_workers)
+        
+        # Run timestamp, formatted once and shared by this applier's file names
+        timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         # Unified log file naming - support custom suffix or shared log file
         if shared_log_file:
@@ -25,9 +80,14 @@ class EnhancedBatchApplier:
         elif log_suffix:
             self.error_log_file = f"apply_changes_{target_table_name}_{log_suffix}.log"
         else:
-            timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
             self.error_log_file = f"apply_changes_{target_table_name}_{timestamp_str}.log"
         
+        # Failed records from all batches of this applier go to one NDJSON
+        # file, written once per apply_records call
+        self.error_records_file = f"batch_errors_{target_table_name}_{timestamp_str}.ndjson"
+        self._error_buffer = []
+        self._error_lock = threading.Lock()
+        
         # Configure logging - use append mode, multiple calls share same file
         logger_name = f"batch_applier_{target_table_name}_{log_suffix or 'standalone'}"
         self.logger = logging.getLogger(logger_name)
@@ -40,21 +100,32 @@ class EnhancedBatchApplier:
             # File handler - always append mode for shared logging
             file_handler = logging.FileHandler(self.error_log_file, mode='a')
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
+            handlers = [file_handler]
             
             # Console handler - only add if not in disaster recovery mode
             if not log_suffix or not log_suffix.startswith('disaster_recovery'):
                 console_handler = logging.StreamHandler()
                 console_handler.setFormatter(formatter)
-                self.logger.addHandler(console_handler)
+                handlers.append(console_handler)
+            
+            # Writer threads only enqueue log records; a background listener
+            # does the file/console I/O so logging never stalls a batch
+            log_queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, *handlers)
+            listener.start()
+            atexit.register(listener.stop)
+            self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
         
         # Prevent propagation to avoid duplicate logs
         self.logger.propagate = False
         
-        # Initialize AWS clients
-        self.s3 = boto3.client('s3', region_name=region)
-        self.dynamodb = boto3.resource('dynamodb', region_name=region)
+        # Initialize AWS clients - shared, adaptive-retry clients with a pool
+        # sized for the concurrent prefetch reads and shard writers
+        self.s3 = get_client('s3', region)
+        self.dynamodb = get_resource('dynamodb', region)
         self.table = self.dynamodb.Table(target_table_name)
+        # Low-level client for writes, shared by all writer threads
+        self.ddb_client = get_client('dynamodb', region)
         
         # Verify table exists
         self._verify_table()
@@ -62,150 +133,323 @@ class EnhancedBatchApplier:
     @retry_dynamodb_operation
     def _verify_table(self):
         """Verify target table exists"""
+        table_id = (self.region, self.target_table_name)
+        if table_id in EnhancedBatchApplier._verified_tables:
+            return
         try:
             self.table.load()
+            EnhancedBatchApplier._verified_tables.add(table_id)
             self.logger.info(f"✅ Target table {self.target_table_name} verified successfully")
         except ClientError:
             raise ValueError(f"❌ Table {self.target_table_name} does not exist")
     
     @retry_s3_operation
     def _read_s3_file(self, bucket: str, key: str) -> list:
-        """Read file from S3 with retry"""
+        """Read file from S3 with retry
+        
+        Accepts a JSON array or NDJSON (one record per line), either of them
+        optionally gzip-compressed; the format is detected from the content.
+        """
         obj = self.s3.get_object(Bucket=bucket, Key=key)
-        records = json.loads(obj['Body'].read())
+        body = obj['Body'].read()
+        if body[:2] == b'\x1f\x8b':
+            body = gzip.decompress(body)
+        if body.lstrip()[:1] == b'[':
+            records = _json_loads(body)
+        else:
+            records = [_json_loads(line) for line in body.splitlines() if line.strip()]
         self.logger.info(f"📄 Read {len(records)} records from S3")
         return records
     
+    @staticmethod
+    def _write_request(record: dict) -> dict:
+        """BatchWriteItem request for a stream record"""
+        if record['eventName'] == 'REMOVE':
+            return {'DeleteRequest': {'Key': _wire_image(record['dynamodb']['Keys'])}}
+        # Stream images are already in DynamoDB JSON, so they are written
+        # without a deserialize/serialize round trip (only binary is decoded)
+        return {'PutRequest': {'Item': _wire_image(record['dynamodb']['NewImage'])}}
+    
+    @staticmethod
+    def _key_identity(record: dict) -> tuple:
+        """Hashable identity of the item a stream record changes"""
+        return tuple(sorted((name, tuple(value.items())) for name, value in record['dynamodb']['Keys'].items()))
+    
+    @staticmethod
+    def _request_key_identity(request: dict, key_names) -> tuple:
+        """Hashable identity of the item a BatchWriteItem request writes
+        
+        Works for both the requests sent and the parsed UnprocessedItems,
+        where binary values come back as bytes.
+        """
+        if 'DeleteRequest' in request:
+            attributes = request['DeleteRequest']['Key']
+        else:
+            attributes = request['PutRequest']['Item']
+        return tuple(sorted((name, tuple(attributes[name].items())) for name in key_names))
+    
+    def _batch_write(self, requests: list) -> list:
+        """Send one BatchWriteItem, resending UnprocessedItems with backoff
+        
+        Returns the requests that are still unprocessed after all retries.
+        """
+        pending = requests
+        for attempt in range(UNPROCESSED_MAX_RETRIES):
+            response = self.ddb_client.batch_write_item(RequestItems={self.target_table_name: pending})
+            pending = response.get('UnprocessedItems', {}).get(self.target_table_name, [])
+            if not pending or attempt == UNPROCESSED_MAX_RETRIES - 1:
+                break
+            # Unprocessed items mean the table or a partition is throttling;
+            # full jitter keeps the shard writers from resending in lockstep
+            time.sleep(random.uniform(0, min(UNPROCESSED_MAX_DELAY, UNPROCESSED_INITIAL_DELAY * 2 ** attempt)))
+        return pending
+    
+    def _apply_single_record(self, record: dict):
+        """Apply one record with PutItem/DeleteItem (fallback for BatchWriteItem)"""
+        event = record['eventName']
+        
+        if event in ['INSERT', 'MODIFY']:
+            # INSERT/MODIFY unified using idempotent put_item
+            # Prerequisite: NewImage contains complete record
+            self.ddb_client.put_item(
+                TableName=self.target_table_name,
+                Item=_wire_image(record['dynamodb']['NewImage'])
+            )
+            
+        elif event == 'REMOVE':
+            # REMOVE operation - unconditional delete, same as the batch
+            # DeleteRequest; deleting a missing item is already a no-op
+            self.ddb_client.delete_item(
+                TableName=self.target_table_name,
+                Key=_wire_image(record['dynamodb']['Keys'])
+            )
+    
+    def _apply_chunk(self, chunk: list, stats: dict, error_records: list):
+        """Apply up to 25 (index, record, request) triples with distinct keys in one BatchWriteItem"""
+        requests = [request for _, _, request in chunk]
+        
+        try:
+            unprocessed = self._batch_write(requests)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ValidationException':
+                raise
+            self.logger.warning(f"⚠️ BatchWriteItem rejected {len(chunk)} records, applying them one by one: {e}")
+            unprocessed = requests
+        
+        # Match leftovers by item key - the parsed UnprocessedItems are not
+        # guaranteed to compare equal to the request dicts that were sent
+        key_names = list(chunk[0][1]['dynamodb']['Keys'])
+        unprocessed_keys = {self._request_key_identity(request, key_names) for request in unprocessed}
+        fallback = [(i, record) for i, record, request in chunk
+                    if self._request_key_identity(request, key_names) in unprocessed_keys]
+        stats['applied'] += len(chunk) - len(fallback)
+        
+        for i, record in fallback:
+            try:
+                self._apply_single_record(record)
+                stats['applied'] += 1
+            except Exception as e:
+                stats['errors'] += 1
+                error_msg = f"Record {i}: {str(e)}"
+                self.logger.error(error_msg)
+                
+                error_records.append({
+                    'record_index': i,
+                    'error': str(e),
+                    'record_data': record
+                })
+    
     @retry_dynamodb_operation
     def _apply_batch_with_retry(self, batch_records: list) -> dict:
-        """Apply single batch with retry mechanism"""
+        """Apply single batch with retry mechanism
+        
+        Records are written with BatchWriteItem in order. A new request is
+        started whenever it is full or a key repeats, because one request may
+        not touch the same item twice and gives no ordering within it.
+        """
         stats = {'applied': 0, 'errors': 0}
         error_records = []
-        
-        # Use direct write, not batch_writer deduplication logic
-        dynamodb_client = boto3.client('dynamodb', region_name=self.table.meta.client.meta.region_name)
+        chunk = []
+        chunk_keys = set()
         
         for i, record in enumerate(batch_records):
             try:
-                event = record['eventName']
-                
-                if event in ['INSERT', 'MODIFY']:
-                    # INSERT/MODIFY unified using idempotent put_item
-                    # Prerequisite: NewImage contains complete record
-                    item = {k: self.deserializer.deserialize(v) 
-                           for k, v in record['dynamodb']['NewImage'].items()}
-                    
-                    from boto3.dynamodb.types import TypeSerializer
-                    serializer = TypeSerializer()
-                    ddb_item = {k: serializer.serialize(v) for k, v in item.items()}
-                    
-                    # Idempotent PUT operation
-                    dynamodb_client.put_item(
-                        TableName=self.target_table_name,
-                        Item=ddb_item
-                    )
-                    stats['applied'] += 1
-                    
-                elif event == 'REMOVE':
-                    # REMOVE operation - delete existing record
-                    key_attrs = {k: self.deserializer.deserialize(v) 
-                               for k, v in record['dynamodb']['Keys'].items()}
-                    
-                    from boto3.dynamodb.types import TypeSerializer
-                    serializer = TypeSerializer()
-                    ddb_key = {k: serializer.serialize(v) for k, v in key_attrs.items()}
-                    
-                    try:
-                        dynamodb_client.delete_item(
-                            TableName=self.target_table_name,
-                            Key=ddb_key,
-                            ConditionExpression='attribute_exists(#pk)',
-                            ExpressionAttributeNames={'#pk': list(key_attrs.keys())[0]}
-                        )
-                        stats['applied'] += 1
-                    except ClientError as e:
-                        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-                            self.logger.info(f"REMOVE skipped - record does not exist")
-                            stats['applied'] += 1
-                        else:
-                            raise
-                    
+                if record['eventName'] not in ('INSERT', 'MODIFY', 'REMOVE'):
+                    continue
+                key = self._key_identity(record)
+                # Built here so a malformed record (e.g. a MODIFY without
+                # NewImage) is reported on its own and not with its batch
+                request = self._write_request(record)
             except Exception as e:
                 stats['errors'] += 1
-                error_msg = f"Record {i}: {str(e)}"
-                self.logger.error(error_msg)
-                
+                self.logger.error(f"Record {i}: {str(e)}")
                 error_records.append({
                     'record_index': i,
                     'error': str(e),
                     'record_data': record
                 })
+                continue
+            
+            if len(chunk) == BATCH_WRITE_LIMIT or key in chunk_keys:
+                self._apply_chunk(chunk, stats, error_records)
+                chunk, chunk_keys = [], set()
+            chunk.append((i, record, request))
+            chunk_keys.add(key)
+        
+        if chunk:
+            self._apply_chunk(chunk, stats, error_records)
         
-        # Save error records
+        # Keep error records until the end of the file
         if error_records:
-            error_file = f"batch_errors_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(error_file, 'w') as f:
-                json.dump(error_records, f, indent=2, default=str)
-            self.logger.warning(f"⚠️ Batch error details saved to: {error_file}")
+            with self._error_lock:
+                self._error_buffer.extend(error_records)
         
         return stats
     
+    def _flush_error_records(self):
+        """Append buffered error records to the run's error file"""
+        with self._error_lock:
+            error_records, self._error_buffer = self._error_buffer, []
+        if not error_records:
+            return
+        
+        with open(self.error_records_file, 'a') as f:
+            f.writelines(json.dumps(r, default=str) + '\n' for r in error_records)
+        self.logger.warning(f"⚠️ {len(error_records)} error record(s) saved to: {self.error_records_file}")
+    
+    def _coalesce_by_key(self, records: list) -> list:
+        """Keep only the last change per item - earlier states would be overwritten anyway"""
+        latest = {}
+        for position, record in enumerate(records):
+            try:
+                if record['eventName'] not in ('INSERT', 'MODIFY', 'REMOVE'):
+                    raise ValueError(record['eventName'])
+                key = self._key_identity(record)
+            except Exception:
+                # Not a keyed write - kept as-is so it is handled (or reported) as before
+                key = position
+            latest[key] = record
+        return list(latest.values())
+    
+    def _shard_by_key(self, records: list) -> list:
+        """Split records into up to max_workers shards by item key, keeping order"""
+        shards = [[] for _ in range(self.max_workers)]
+        for record in records:
+            try:
+                index = hash(self._key_identity(record)) % self.max_workers
+            except Exception:
+                # Malformed record - any shard will report it as an error
+                index = 0
+            shards[index].append(record)
+        return [shard for shard in shards if shard]
+    
+    def _apply_in_batches(self, records: list, batch_size: int, label: str = '') -> dict:
+        """Apply records in order, batch_size at a time, and return statistics"""
+        # Process records in batches
+        total_stats = {'applied': 0, 'errors': 0}
+        total_batches = (len(records) + batch_size - 1) // batch_size
+        
+        for i in range(0, len(records), batch_size):
+            batch_records = records[i:i + batch_size]
+            batch_num = i // batch_size + 1
+            
+            self.logger.info(f"🔄 Processing batch {batch_num}/{total_batches}{label} ({len(batch_records)} records)")
+            
+            # Apply batch (with retry)
+            max_batch_retries = 3
+            batch_success = False
+            
+            for retry_attempt in range(max_batch_retries):
+                try:
+                    batch_stats = self._apply_batch_with_retry(batch_records)
+                    
+                    # Accumulate statistics
+                    total_stats['applied'] += batch_stats['applied']
+                    total_stats['errors'] += batch_stats['errors']
+                    
+                    batch_success = True
+                    break
+                    
+                except Exception as e:
+                    if retry_attempt < max_batch_retries - 1:
+                        delay = 2 ** retry_attempt  # Exponential backoff
+                        self.logger.warning(f"⚠️ Batch {batch_num}{label} failed, retrying in {delay}s: {e}")
+                        time.sleep(delay)
+                    else:
+                        self.logger.error(f"❌ Batch {batch_num}{label} final failure: {e}")
+                        total_stats['errors'] += len(batch_records)
+            
+            if not batch_success:
+                self.logger.error(f"❌ Batch {batch_num}{label} processing failed")
+        
+        return total_stats
+    
+    def read_changes_from_s3(self, s3_file_path: str, min_creation_time: float = None) -> list:
+        """Read change records from S3 file (with retry), without applying them
+        
+        If min_creation_time (epoch seconds) is given, stream records created
+        before it are dropped - they are already contained in the full backup.
+        """
+        bucket, key = s3_file_path.replace('s3://', '').split('/', 1)
+        records = self._read_s3_file(bucket, key)
+        
+        if min_creation_time is not None:
+            total = len(records)
+            records = [
+                r for r in records
+                if float(r.get('dynamodb', {}).get('ApproximateCreationDateTime', min_creation_time)) >= min_creation_time
+            ]
+            if len(records) < total:
+                self.logger.info(f"⏭️ Skipped {total - len(records)} records older than replay window")
+        
+        return records
+    
     def apply_changes_from_s3(self, s3_file_path: str, batch_size: int = 100) -> bool:
         """Apply changes from S3 file with complete retry mechanism"""
         try:
-            # Parse S3 path
-            bucket, key = s3_file_path.replace('s3://', '').split('/', 1)
+            # Read S3 file (with retry)
+            records = self.read_changes_from_s3(s3_file_path)
             
-            # Log start of file processing
-            self.logger.info(f"🔄 Starting to process file: {s3_file_path}")
+            return self.apply_records(records, s3_file_path, batch_size)
             
-            # Read S3 file (with retry)
-            records = self._read_s3_file(bucket, key)
+        except Exception as e:
+            self.logger.error(f"❌ Apply changes failed: {e}")
+            return False
+    
+    def apply_records(self, records: list, label: str, batch_size: int = 100) -> bool:
+        """Apply change records already read; label names their source in the log"""
+        try:
+            # Log start of file processing
+            self.logger.info(f"🔄 Starting to process file: {label}")
             
             if not records:
                 self.logger.info("📄 File is empty, no processing needed")
                 return True
             
-            # Process records in batches
-            total_stats = {'applied': 0, 'errors': 0}
-            total_batches = (len(records) + batch_size - 1) // batch_size
+            # Only the final state of each item needs to be written
+            total_records = len(records)
+            records = self._coalesce_by_key(records)
+            if len(records) < total_records:
+                self.logger.info(f"🗜️ Coalesced {total_records} records → {len(records)} writes")
             
-            for i in range(0, len(records), batch_size):
-                batch_records = records[i:i + batch_size]
-                batch_num = i // batch_size + 1
-                
-                self.logger.info(f"🔄 Processing batch {batch_num}/{total_batches} ({len(batch_records)} records)")
-                
-                # Apply batch (with retry)
-                max_batch_retries = 3
-                batch_success = False
-                
-                for retry_attempt in range(max_batch_retries):
-                    try:
-                        batch_stats = self._apply_batch_with_retry(batch_records)
-                        
-                        # Accumulate statistics
-                        total_stats['applied'] += batch_stats['applied']
-                        total_stats['errors'] += batch_stats['errors']
-                        
-                        batch_success = True
-                        break
-                        
-                    except Exception as e:
-                        if retry_attempt < max_batch_retries - 1:
-                            delay = 2 ** retry_attempt  # Exponential backoff
-                            self.logger.warning(f"⚠️ Batch {batch_num} failed, retrying in {delay}s: {e}")
-                            time.sleep(delay)
-                        else:
-                            self.logger.error(f"❌ Batch {batch_num} final failure: {e}")
-                            total_stats['errors'] += len(batch_records)
-                
-                if not batch_success:
-                    self.logger.error(f"❌ Batch {batch_num} processing failed")
+            if self.max_workers > 1 and len(records) > batch_size:
+                # All changes to one item land in the same shard and each shard
+                # is applied in order, so shards can be written concurrently
+                shards = self._shard_by_key(records)
+                with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+                    futures = [executor.submit(self._apply_in_batches, shard, batch_size, f" [shard {n}/{len(shards)}]")
+                               for n, shard in enumerate(shards, 1)]
+                    results = [future.result() for future in futures]
+                total_stats = {
+                    'applied': sum(r['applied'] for r in results),
+                    'errors': sum(r['errors'] for r in results)
+                }
+            else:
+                total_stats = self._apply_in_batches(records, batch_size)
             
             # Output final statistics
             success_rate = (total_stats['applied'] / len(records)) * 100 if records else 100
-            self.logger.info(f"📊 File {key} processing completed: {total_stats['applied']} success, {total_stats['errors']} failed ({success_rate:.1f}%)")
+            self.logger.info(f"📊 File {label} processing completed: {total_stats['applied']} success, {total_stats['errors']} failed ({success_rate:.1f}%)")
             
             if total_stats['errors'] > 0:
                 self.logger.warning(f"⚠️ Error log: {self.error_log_file}")
@@ -215,6 +459,9 @@ class EnhancedBatchApplier:
         except Exception as e:
             self.logger.error(f"❌ Apply changes failed: {e}")
             return False
+        
+        finally:
+            self._flush_error_records()
 
 def main():
     parser = argparse.ArgumentParser(description='Enhanced DynamoDB Change Applier (with retry)')
@@ -222,10 +469,11 @@ def main():
     parser.add_argument('--target-table', required=True, help='Target table name')
     parser.add_argument('--region', default='us-west-2', help='AWS region')
     parser.add_argument('--batch-size', type=int, default=100, help='Batch processing size')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent writers (records are sharded by key)')
     
     args = parser.parse_args()
     
-    applier = EnhancedBatchApplier(args.target_table, args.region)
+    applier = EnhancedBatchApplier(args.target_table, args.region, max_workers=args.workers)
     success = applier.apply_changes_from_s3(args.s3_file_path, args.batch_size)
     
     if success:
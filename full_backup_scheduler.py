@@ -4,19 +4,26 @@ DynamoDB全量备份调度器
 使用DynamoDB Export功能定期导出全量数据到S3
 """
 
-import boto3
 import json
 import os
+import random
+import time
 from datetime import datetime, timezone
 from typing import Dict, Any
+from botocore.exceptions import ClientError
+from aws_clients import get_client
+
+# INDEX.jsonl/LATEST.json条件写入冲突(并发写入方)时的最大重试次数
+INDEX_UPDATE_RETRIES = 5
 
 class DynamoDBFullBackup:
     def __init__(self, source_region: str, backup_bucket: str, backup_region: str):
         self.source_region = source_region
         self.backup_bucket = backup_bucket
         self.backup_region = backup_region
-        self.ddb_client = boto3.client('dynamodb', region_name=source_region)
-        self.s3_client = boto3.client('s3', region_name=backup_region)
+        # 共享客户端配置: 连接池、TCP keepalive、自适应重试
+        self.ddb_client = get_client('dynamodb', source_region)
+        self.s3_client = get_client('s3', backup_region)
     
     def export_table_to_s3(self, table_name: str) -> Dict[str, Any]:
         """导出DynamoDB表到S3"""
@@ -25,7 +32,7 @@ class DynamoDBFullBackup:
         
         try:
             response = self.ddb_client.export_table_to_point_in_time(
-                TableArn=f"arn:aws:dynamodb:{self.source_region}:{boto3.client('sts').get_caller_identity()['Account']}:table/{table_name}",
+                TableArn=f"arn:aws:dynamodb:{self.source_region}:{get_client('sts').get_caller_identity()['Account']}:table/{table_name}",
                 S3Bucket=self.backup_bucket,
                 S3Prefix=export_prefix,
                 ExportFormat='DYNAMODB_JSON'
@@ -51,12 +58,75 @@ class DynamoDBFullBackup:
                 Body=json.dumps(metadata, indent=2)
             )
             
+            # 导出已启动且元数据已写入，索引只用于加速查找(恢复时可回退到列举)，
+            # 更新失败不影响本次备份
+            try:
+                self.update_backup_index(table_name, metadata, metadata_key)
+            except Exception as e:
+                print(f"⚠️ 备份索引更新失败，恢复时将回退到列举元数据: {e}")
+            
             return metadata
             
         except Exception as e:
             print(f"❌ 全量备份失败: {e}")
             raise
 
+    def update_backup_index(self, table_name: str, metadata: Dict[str, Any], metadata_key: str):
+        """更新INDEX.jsonl索引和LATEST.json指针，恢复时无需逐个读取元数据"""
+        prefix = f"backup-metadata/{table_name}/"
+        
+        # INDEX.jsonl: 每行一份完整元数据及其key，按时间点查找时只需读取这一个对象
+        index_key = f"{prefix}INDEX.jsonl"
+        entry = json.dumps(dict(metadata, key=metadata_key))
+        self._conditional_update(index_key, lambda body: (body or '') + entry + '\n')
+        print(f"📇 备份索引已更新: s3://{self.backup_bucket}/{index_key}")
+        
+        # LATEST.json: 最新备份元数据的副本，索引写入成功后再更新，
+        # 且只在本次备份比当前指针更新时覆盖(并发运行时不会回退到旧备份)
+        def newer_pointer(body):
+            if body is not None:
+                try:
+                    if json.loads(body)['export_time'] >= metadata['export_time']:
+                        return None
+                except (ValueError, KeyError, TypeError):
+                    pass  # 指针已损坏，直接覆盖
+            return json.dumps(metadata, indent=2)
+        
+        self._conditional_update(f"{prefix}LATEST.json", newer_pointer)
+    
+    def _conditional_update(self, key: str, build_body):
+        """对S3对象做读-改-写，条件PUT(IfMatch读到的ETag)，并发写入时重读重试
+        
+        build_body接收当前内容(对象不存在时为None)，返回新内容；返回None表示无需写入
+        """
+        for attempt in range(INDEX_UPDATE_RETRIES):
+            try:
+                obj = self.s3_client.get_object(Bucket=self.backup_bucket, Key=key)
+                current = obj['Body'].read().decode('utf-8')
+                condition = {'IfMatch': obj['ETag']}
+            except self.s3_client.exceptions.NoSuchKey:
+                current = None
+                condition = {'IfNoneMatch': '*'}
+            
+            body = build_body(current)
+            if body is None:
+                return
+            
+            try:
+                self.s3_client.put_object(
+                    Bucket=self.backup_bucket,
+                    Key=key,
+                    Body=body,
+                    **condition
+                )
+                return
+            except ClientError as e:
+                if (e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict')
+                        or attempt == INDEX_UPDATE_RETRIES - 1):
+                    raise
+                print(f"⚠️ {key}被并发更新，重试({attempt + 1}/{INDEX_UPDATE_RETRIES})...")
+                time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+
     def check_export_status(self, export_arn: str) -> str:
         """检查导出状态"""
         try:
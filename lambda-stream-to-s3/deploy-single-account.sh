@@ -66,7 +66,7 @@ echo ""
 echo "Resources created:"
 echo "- S3 Bucket: $BUCKET_NAME (region: $TARGET_REGION)"
 echo "- Lambda Function: ddb-stream-single-account-test-StreamToS3Function-XXXXX"
-echo "- Lambda配置: BatchSize=1000, MaximumBatchingWindowInSeconds=60"
+echo "- Lambda配置: BatchSize=10000, MaximumBatchingWindowInSeconds=60"
 echo ""
 echo "Test the setup:"
 echo "1. Insert test data:"
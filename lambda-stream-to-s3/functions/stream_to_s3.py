@@ -1,7 +1,31 @@
 import os
+import gzip
 import json
 import boto3
-from datetime import datetime
+from botocore.config import Config
+from datetime import datetime, timezone, timedelta
+
+# Records are serialized with orjson when it is packaged (faster, and it
+# produces bytes directly); compact stdlib JSON is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def encode_records(records):
+    """Serialize stream records to a compact JSON array (bytes)"""
+    if orjson is not None:
+        return orjson.dumps(records, default=str)
+    return json.dumps(records, default=str, separators=(',', ':')).encode('utf-8')
+
+# Keep-alive connections with short connect/read timeouts; a stalled PUT is
+# retried instead of running the invocation into its timeout
+S3_CLIENT_CONFIG = Config(tcp_keepalive=True, connect_timeout=3, read_timeout=30)
+
+# Assumed-role credentials last an hour; the S3 client built from them is
+# kept across warm invocations and rebuilt shortly before they expire
+CREDENTIAL_REFRESH_MARGIN = timedelta(minutes=5)
+_s3_client_cache = {}
 
 def lambda_handler(event, context):
     """Lambda function to capture DynamoDB stream changes and save to cross-account S3"""
@@ -16,17 +40,8 @@ def lambda_handler(event, context):
     role_arn = f"arn:aws:iam::{target_aws_account_num}:role/{target_role_name}"
 
     try:
-        # Get cross-account credentials
-        sts_response = get_credentials(role_arn)
-        
-        # Create S3 client with cross-account credentials
-        s3 = boto3.client(
-            's3', 
-            region_name=target_region,
-            aws_access_key_id=sts_response['AccessKeyId'],
-            aws_secret_access_key=sts_response['SecretAccessKey'],
-            aws_session_token=sts_response['SessionToken']
-        )
+        # S3 client with cross-account credentials (cached while valid)
+        s3 = get_s3_client(role_arn, target_region)
 
         # Process DynamoDB stream records
         records = event.get('Records', [])
@@ -35,14 +50,16 @@ def lambda_handler(event, context):
 
         # Generate S3 key with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        s3_key = f"{s3_prefix}/ddb_changes_{timestamp}.json"
+        s3_key = f"{s3_prefix}/ddb_changes_{timestamp}.json.gz"
         
-        # Save records to S3
+        # Save records to S3, gzip-compressed (level 1 keeps most of the
+        # ratio on repetitive stream JSON at a fraction of the CPU)
         s3.put_object(
             Bucket=target_s3_bucket,
             Key=s3_key,
-            Body=json.dumps(records, default=str),
-            ContentType='application/json'
+            Body=gzip.compress(encode_records(records), compresslevel=1),
+            ContentType='application/json',
+            ContentEncoding='gzip'
         )
         
         print(f"Successfully saved {len(records)} records to s3://{target_s3_bucket}/{s3_key}")
@@ -57,6 +74,27 @@ def lambda_handler(event, context):
         print(f"Error processing records: {str(e)}")
         raise e
 
+def get_s3_client(role_arn, region):
+    """Return an S3 client for the assumed role, re-assuming it near expiry"""
+    cache_key = (role_arn, region)
+    cached = _s3_client_cache.get(cache_key)
+    if cached and cached[1] - CREDENTIAL_REFRESH_MARGIN > datetime.now(timezone.utc):
+        return cached[0]
+
+    # Get cross-account credentials
+    sts_response = get_credentials(role_arn)
+
+    s3 = boto3.client(
+        's3', 
+        region_name=region,
+        aws_access_key_id=sts_response['AccessKeyId'],
+        aws_secret_access_key=sts_response['SecretAccessKey'],
+        aws_session_token=sts_response['SessionToken'],
+        config=S3_CLIENT_CONFIG
+    )
+    _s3_client_cache[cache_key] = (s3, sts_response['Expiration'])
+    return s3
+
 def get_credentials(role_arn):
     """Assume cross-account role and return temporary credentials"""
     sts_client = boto3.client('sts')
@@ -61,15 +61,15 @@ LATEST_FILE=$(aws s3 ls s3://$BUCKET_NAME/ddb-changes/ --region $TARGET_REGION |
 
 if [ ! -z "$LATEST_FILE" ]; then
     echo "Latest file: $LATEST_FILE"
-    aws s3 cp s3://$BUCKET_NAME/ddb-changes/$LATEST_FILE ./latest_changes.json --region $TARGET_REGION
+    aws s3 cp s3://$BUCKET_NAME/ddb-changes/$LATEST_FILE ./latest_changes.json.gz --region $TARGET_REGION
     
     echo ""
     echo "5. File contents:"
-    cat latest_changes.json | jq '.[0] | {eventName, dynamodb: {Keys, NewImage, OldImage}}'
+    gunzip -c latest_changes.json.gz | jq '.[0] | {eventName, dynamodb: {Keys, NewImage, OldImage}}'
     
     echo ""
     echo "Total records in file:"
-    cat latest_changes.json | jq '. | length'
+    gunzip -c latest_changes.json.gz | jq '. | length'
 else
     echo "No files found. Check Lambda logs:"
     echo "aws logs describe-log-groups --log-group-name-prefix /aws/lambda/ddb-stream-single-account-test"
@@ -5,14 +5,31 @@
 """
 
 import time
+import random
+import logging
 import functools
 from typing import Callable, Type, Tuple
 from botocore.exceptions import ClientError
 
+logger = logging.getLogger(__name__)
+
+def _backoff_delay(attempt: int, initial_delay: float, backoff_factor: float, max_delay: float) -> float:
+    """全抖动退避: 在[0, min(上限, 指数延迟)]内随机取值，避免并发重试同时打到服务端"""
+    return random.uniform(0, min(max_delay, initial_delay * backoff_factor ** attempt))
+
+def _retry_after(error: ClientError) -> float:
+    """服务端返回的Retry-After(秒)，没有或无法解析时返回0"""
+    headers = error.response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    try:
+        return float(headers.get('retry-after', 0))
+    except (TypeError, ValueError):
+        return 0.0
+
 def retry_with_backoff(
     max_retries: int = 3,
     initial_delay: float = 1.0,
     backoff_factor: float = 2.0,
+    max_delay: float = 20.0,
     exceptions: Tuple[Type[Exception], ...] = (Exception,),
     retriable_errors: Tuple[str, ...] = (
         'ProvisionedThroughputExceededException',
@@ -23,19 +40,19 @@ def retry_with_backoff(
     )
 ):
     """
-    重试装饰器，支持指数退避
+    重试装饰器，支持带全抖动的指数退避
     
     Args:
         max_retries: 最大重试次数
         initial_delay: 初始延迟(秒)
         backoff_factor: 退避因子
+        max_delay: 单次延迟上限(秒)
         exceptions: 需要重试的异常类型
         retriable_errors: 可重试的AWS错误代码
     """
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            delay = initial_delay
             last_exception = None
             
             for attempt in range(max_retries + 1):
@@ -47,28 +64,31 @@ def retry_with_backoff(
                     
                     # 检查是否为可重试错误
                     if error_code not in retriable_errors:
-                        print(f"❌ 不可重试错误: {error_code}")
+                        logger.error(f"❌ 不可重试错误: {error_code}")
                         raise
                     
                     last_exception = e
                     
                     if attempt < max_retries:
-                        print(f"⚠️ {error_code}, 第{attempt + 1}次重试，{delay:.1f}秒后...")
+                        # 服务端给出Retry-After时至少等待该时长，但同样不超过max_delay
+                        delay = min(max_delay,
+                                    max(_backoff_delay(attempt, initial_delay, backoff_factor, max_delay),
+                                        _retry_after(e)))
+                        logger.warning(f"⚠️ {error_code}, 第{attempt + 1}次重试，{delay:.1f}秒后...")
                         time.sleep(delay)
-                        delay *= backoff_factor
                     else:
-                        print(f"❌ 达到最大重试次数({max_retries})")
+                        logger.error(f"❌ 达到最大重试次数({max_retries})")
                         raise
                         
                 except exceptions as e:
                     last_exception = e
                     
                     if attempt < max_retries:
-                        print(f"⚠️ 错误: {type(e).__name__}, 第{attempt + 1}次重试，{delay:.1f}秒后...")
+                        delay = _backoff_delay(attempt, initial_delay, backoff_factor, max_delay)
+                        logger.warning(f"⚠️ 错误: {type(e).__name__}, 第{attempt + 1}次重试，{delay:.1f}秒后...")
                         time.sleep(delay)
-                        delay *= backoff_factor
                     else:
-                        print(f"❌ 达到最大重试次数({max_retries})")
+                        logger.error(f"❌ 达到最大重试次数({max_retries})")
                         raise
             
             # 不应该到达这里
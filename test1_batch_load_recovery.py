@@ -9,15 +9,18 @@
 - 验证数据一致性
 """
 
-import boto3
 import json
 import time
+import random
 import threading
 import logging
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import uuid
 
+from aws_clients import get_client
+from full_backup_scheduler import DynamoDBFullBackup
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -42,10 +45,14 @@ class BatchLoadRecoveryTest:
         if not self.backup_bucket:
             raise ValueError("TEST_S3_BUCKET环境变量未设置，请先运行run_test1.sh")
         
-        # DynamoDB客户端
-        self.ddb_source = boto3.client('dynamodb', region_name=self.source_region)
-        self.ddb_target = boto3.client('dynamodb', region_name=self.target_region)
-        self.s3 = boto3.client('s3', region_name=self.target_region)
+        # DynamoDB客户端 (共享配置: 连接池、TCP keepalive、自适应重试)
+        self.ddb_source = get_client('dynamodb', self.source_region)
+        self.ddb_target = get_client('dynamodb', self.target_region)
+        self.s3 = get_client('s3', self.target_region)
+        
+        # 源表ARN只构造一次；账户ID优先取环境变量，避免Export触发时再调用STS
+        account_id = os.environ.get('AWS_ACCOUNT_ID') or get_client('sts').get_caller_identity()['Account']
+        self.source_table_arn = f'arn:aws:dynamodb:{self.source_region}:{account_id}:table/{self.source_table}'
         
         # 测试参数
         self.total_records = 100000
@@ -54,6 +61,10 @@ class BatchLoadRecoveryTest:
         
         # 状态跟踪
         self.loaded_count = 0
+        self.loaded_lock = threading.Lock()
+        self.half_loaded = threading.Event()  # 加载过半时触发Export
+        self.send_lock = threading.Lock()
+        self.next_send_time = 0.0  # 下一批次的发送时间点 (time.monotonic)
         self.export_arn = None
         self.export_start_time = None
         self.load_complete_time = None
@@ -62,60 +73,69 @@ class BatchLoadRecoveryTest:
         """清理测试环境"""
         logger.info("🧹 清理测试环境...")
         
-        # 删除源表
-        try:
-            self.ddb_source.delete_table(TableName=self.source_table)
-            logger.info(f"✅ 删除源表: {self.source_table}")
-            
-            # 等待表删除完成
-            waiter = self.ddb_source.get_waiter('table_not_exists')
-            waiter.wait(TableName=self.source_table)
-        except Exception as e:
-            if 'ResourceNotFoundException' not in str(e):
-                logger.error(f"删除源表失败: {e}")
-        
-        # 删除目标表
+        # 源表、目标表删除和S3桶清理互不依赖，并行执行
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [
+                executor.submit(self.drop_table, self.ddb_source, self.source_table, '源表'),
+                executor.submit(self.drop_table, self.ddb_target, self.target_table, '目标表'),
+                executor.submit(self.cleanup_s3_buckets)
+            ]
+            for future in futures:
+                future.result()
+    
+    def drop_table(self, ddb_client, table_name, label):
+        """删除表并等待删除完成"""
         try:
-            self.ddb_target.delete_table(TableName=self.target_table)
-            logger.info(f"✅ 删除目标表: {self.target_table}")
+            ddb_client.delete_table(TableName=table_name)
+            logger.info(f"✅ 删除{label}: {table_name}")
             
-            # 等待表删除完成
-            waiter = self.ddb_target.get_waiter('table_not_exists')
-            waiter.wait(TableName=self.target_table)
+            # 等待表删除完成 (5秒轮询，总等待上限与默认的20秒x25次相同)
+            waiter = ddb_client.get_waiter('table_not_exists')
+            waiter.wait(TableName=table_name, WaiterConfig={'Delay': 5, 'MaxAttempts': 100})
         except Exception as e:
             if 'ResourceNotFoundException' not in str(e):
-                logger.error(f"删除目标表失败: {e}")
-        
-        # 清理S3桶
-        self.cleanup_s3_buckets()
+                logger.error(f"删除{label}失败: {e}")
     
     def cleanup_s3_buckets(self):
         """清理相关S3桶"""
         try:
             # 列出所有以test-cross-region-backup开头的桶
             response = self.s3.list_buckets()
-            for bucket in response['Buckets']:
-                bucket_name = bucket['Name']
-                if bucket_name.startswith('test-cross-region-backup'):
-                    logger.info(f"🗑️ 清理S3桶: {bucket_name}")
-                    
-                    # 删除桶中所有对象
-                    try:
-                        objects = self.s3.list_objects_v2(Bucket=bucket_name)
-                        if 'Contents' in objects:
-                            delete_keys = [{'Key': obj['Key']} for obj in objects['Contents']]
-                            self.s3.delete_objects(
-                                Bucket=bucket_name,
-                                Delete={'Objects': delete_keys}
-                            )
-                        
-                        # 删除桶
-                        self.s3.delete_bucket(Bucket=bucket_name)
-                        logger.info(f"✅ 已删除S3桶: {bucket_name}")
-                    except Exception as e:
-                        logger.error(f"删除S3桶失败 {bucket_name}: {e}")
+            bucket_names = [bucket['Name'] for bucket in response['Buckets']
+                            if bucket['Name'].startswith('test-cross-region-backup')]
+            
+            # 多个桶并行清理
+            with ThreadPoolExecutor(max_workers=max(1, min(len(bucket_names), 4))) as executor:
+                list(executor.map(self.delete_s3_bucket, bucket_names))
         except Exception as e:
             logger.error(f"清理S3桶失败: {e}")
+    
+    def delete_s3_bucket(self, bucket_name):
+        """清空并删除单个S3桶"""
+        logger.info(f"🗑️ 清理S3桶: {bucket_name}")
+        
+        try:
+            # 删除桶中所有对象 (含历史版本和删除标记)，每页最多1000个，并行提交
+            paginator = self.s3.get_paginator('list_object_versions')
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                futures = []
+                for page in paginator.paginate(Bucket=bucket_name):
+                    delete_keys = [{'Key': obj['Key'], 'VersionId': obj['VersionId']}
+                                   for obj in page.get('Versions', []) + page.get('DeleteMarkers', [])]
+                    if delete_keys:
+                        futures.append(executor.submit(
+                            self.s3.delete_objects,
+                            Bucket=bucket_name,
+                            Delete={'Objects': delete_keys, 'Quiet': True}
+                        ))
+                for future in futures:
+                    future.result()
+            
+            # 删除桶
+            self.s3.delete_bucket(Bucket=bucket_name)
+            logger.info(f"✅ 已删除S3桶: {bucket_name}")
+        except Exception as e:
+            logger.error(f"删除S3桶失败 {bucket_name}: {e}")
 
     def create_source_table(self):
         """创建源表"""
@@ -195,21 +215,23 @@ class BatchLoadRecoveryTest:
     
     def generate_batch_data(self, start_id, count):
         """生成批量数据"""
-        items = []
-        for i in range(count):
-            item_id = start_id + i
-            items.append({
+        # 同一批次共用时间戳和常量字段，避免逐条调用datetime.now()
+        timestamp = {'S': datetime.now(timezone.utc).isoformat()}
+        test_type = {'S': 'batch_load_test'}
+        return [
+            {
                 'PutRequest': {
                     'Item': {
                         'id': {'S': f'batch-{item_id:06d}'},
                         'data': {'S': f'Test data for item {item_id}'},
-                        'timestamp': {'S': datetime.now(timezone.utc).isoformat()},
+                        'timestamp': timestamp,
                         'batch_id': {'N': str(item_id // 1000)},
-                        'test_type': {'S': 'batch_load_test'}
+                        'test_type': test_type
                     }
                 }
-            })
-        return items
+            }
+            for item_id in range(start_id, start_id + count)
+        ]
     
     def write_batch(self, items):
         """写入一批数据"""
@@ -220,16 +242,20 @@ class BatchLoadRecoveryTest:
                 }
             )
             
-            # 处理未处理的项目
+            # 处理未处理的项目 (与batch_writer相同，重发直到全部写入)
             unprocessed = response.get('UnprocessedItems', {})
             retry_count = 0
-            while unprocessed and retry_count < 3:
-                time.sleep(0.1 * (2 ** retry_count))  # 指数退避
+            while unprocessed and retry_count < 8:
+                time.sleep(min(2.0, 0.1 * (2 ** retry_count)))  # 指数退避
                 response = self.ddb_source.batch_write_item(RequestItems=unprocessed)
                 unprocessed = response.get('UnprocessedItems', {})
                 retry_count += 1
-            
-            return len(items)
+
+            # 只统计实际写入的条数，重试耗尽仍未写入的不计入loaded_count
+            dropped = len(unprocessed.get(self.source_table, []))
+            if dropped:
+                logger.warning(f"⚠️ {dropped} 条记录重试后仍未写入")
+            return len(items) - dropped
         except Exception as e:
             logger.error(f"批量写入失败: {e}")
             return 0
@@ -241,18 +267,34 @@ class BatchLoadRecoveryTest:
             start_id = thread_id * batches_per_thread * self.batch_size + batch_num * self.batch_size
             items = self.generate_batch_data(start_id, self.batch_size)
             
+            # 控制TPS: 所有线程共享发送节奏，总TPS不超过target_tps
+            self.wait_for_send_slot()
             written = self.write_batch(items)
             loaded += written
-            self.loaded_count += written
+            with self.loaded_lock:
+                self.loaded_count += written
+                total = self.loaded_count
             
-            # 控制TPS
-            time.sleep(self.batch_size / self.target_tps)
+            if total >= self.total_records * 0.5:
+                self.half_loaded.set()
             
-            if self.loaded_count % 5000 == 0:
-                logger.info(f"已加载: {self.loaded_count:,} 条记录")
+            # 每跨过5000条打印一次进度
+            if total // 5000 > (total - written) // 5000:
+                logger.info(f"已加载: {total:,} 条记录")
         
         return loaded
     
+    def wait_for_send_slot(self):
+        """按单调时钟预约下一个发送时间点，只睡剩余时间 (全局令牌桶)"""
+        with self.send_lock:
+            now = time.monotonic()
+            slot = max(self.next_send_time, now)
+            self.next_send_time = slot + self.batch_size / self.target_tps
+        
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+    
     def start_batch_loading(self):
         """开始批量数据加载"""
         logger.info(f"🚀 开始批量加载 {self.total_records:,} 条记录 (TPS: {self.target_tps})")
@@ -278,6 +320,8 @@ class BatchLoadRecoveryTest:
                 except Exception as e:
                     logger.error(f"线程执行失败: {e}")
         
+        # 加载未达到50%(写入失败)时也放行Export线程，避免其永久等待
+        self.half_loaded.set()
         self.load_complete_time = datetime.now(timezone.utc)
         elapsed = time.time() - start_time
         actual_tps = self.loaded_count / elapsed
@@ -290,19 +334,14 @@ class BatchLoadRecoveryTest:
     def trigger_export_during_load(self):
         """在加载过程中触发全量备份"""
         # 等待加载到50%时触发Export
-        while self.loaded_count < self.total_records * 0.5:
-            time.sleep(5)
+        self.half_loaded.wait()
         
         logger.info(f"🔄 触发全量备份 (已加载: {self.loaded_count:,} 条)")
         self.export_start_time = datetime.now(timezone.utc)
         
         try:
-            # 动态获取当前账户ID
-            sts = boto3.client('sts')
-            account_id = sts.get_caller_identity()['Account']
-            
             response = self.ddb_source.export_table_to_point_in_time(
-                TableArn=f'arn:aws:dynamodb:{self.source_region}:{account_id}:table/{self.source_table}',
+                TableArn=self.source_table_arn,
                 S3Bucket=self.backup_bucket,
                 S3Prefix=f'full-backups/{self.source_table}/{self.export_start_time.strftime("%Y%m%d_%H%M%S")}/',
                 ExportFormat='DYNAMODB_JSON'
@@ -328,6 +367,11 @@ class BatchLoadRecoveryTest:
                 Body=json.dumps(metadata, indent=2)
             )
             
+            # 与调度器一样维护LATEST.json/INDEX.jsonl，恢复时读一个对象即可定位备份
+            DynamoDBFullBackup(self.source_region, self.backup_bucket, self.target_region).update_backup_index(
+                self.source_table, metadata, metadata_key
+            )
+            
         except Exception as e:
             logger.error(f"❌ Export启动失败: {e}")
     
@@ -337,6 +381,9 @@ class BatchLoadRecoveryTest:
             return False
         
         logger.info("⏳ 等待Export完成...")
+        # 指数退避轮询 (2秒起，上限60秒，带抖动)；状态变化时重置间隔
+        wait = 2.0
+        last_status = None
         while True:
             try:
                 response = self.ddb_source.describe_export(ExportArn=self.export_arn)
@@ -348,12 +395,15 @@ class BatchLoadRecoveryTest:
                 elif status == 'FAILED':
                     logger.error("❌ Export失败")
                     return False
-                else:
+                elif status != last_status:
                     logger.info(f"Export状态: {status}")
-                    time.sleep(30)
+                    last_status = status
+                    wait = 2.0
             except Exception as e:
                 logger.error(f"检查Export状态失败: {e}")
-                time.sleep(30)
+            
+            time.sleep(wait + random.uniform(0, wait * 0.2))
+            wait = min(wait * 1.5, 60)
     
     def delete_target_table(self):
         """删除目标表"""
@@ -403,6 +453,22 @@ class BatchLoadRecoveryTest:
             logger.error(f"❌ 灾难恢复执行失败: {e}")
             return False
     
+    def count_items(self, ddb_client, table_name, segments=8):
+        """并行分段扫描统计表的精确记录数"""
+        def count_segment(segment):
+            # 每个分段跟随LastEvaluatedKey翻页直到结束
+            paginator = ddb_client.get_paginator('scan')
+            pages = paginator.paginate(
+                TableName=table_name,
+                Select='COUNT',
+                Segment=segment,
+                TotalSegments=segments
+            )
+            return sum(page['Count'] for page in pages)
+        
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            return sum(executor.map(count_segment, range(segments)))
+    
     def verify_data_consistency(self):
         """验证数据一致性"""
         logger.info("🔍 验证数据一致性...")
@@ -419,18 +485,12 @@ class BatchLoadRecoveryTest:
             logger.info(f"源表记录数: {source_count:,}")
             logger.info(f"目标表记录数: {target_count:,}")
             
-            # 精确计数验证
-            source_scan = self.ddb_source.scan(
-                TableName=self.source_table,
-                Select='COUNT'
-            )
-            actual_source_count = source_scan['Count']
-            
-            target_scan = self.ddb_target.scan(
-                TableName=self.target_table,
-                Select='COUNT'
-            )
-            actual_target_count = target_scan['Count']
+            # 精确计数验证 (并行分段扫描，源表和目标表同时统计)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                source_future = executor.submit(self.count_items, self.ddb_source, self.source_table)
+                target_future = executor.submit(self.count_items, self.ddb_target, self.target_table)
+                actual_source_count = source_future.result()
+                actual_target_count = target_future.result()
             
             logger.info(f"源表实际记录数: {actual_source_count:,}")
             logger.info(f"目标表实际记录数: {actual_target_count:,}")
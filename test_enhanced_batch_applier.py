@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+enhanced_batch_applier单元测试 (botocore Stubber，无需AWS资源)
+- 批次中的异常记录单独记为错误，写入错误文件
+- 同批次的其他记录照常通过BatchWriteItem写入
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import unittest
+
+import boto3
+from botocore.stub import Stubber
+
+from enhanced_batch_applier import EnhancedBatchApplier
+
+TABLE_NAME = 'test-table'
+
+def make_record(event_name, item_id, with_image=True):
+    """构造一条DynamoDB Stream记录"""
+    keys = {'id': {'S': item_id}}
+    dynamodb = {'Keys': keys}
+    if with_image:
+        dynamodb['NewImage'] = dict(keys, value={'N': '1'})
+    return {'eventName': event_name, 'dynamodb': dynamodb}
+
+class MalformedRecordInBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        # 不调用__init__，避免DescribeTable和日志文件
+        self.applier = EnhancedBatchApplier.__new__(EnhancedBatchApplier)
+        self.applier.target_table_name = TABLE_NAME
+        self.applier.max_workers = 1
+        self.applier.error_log_file = os.path.join(self.tmp_dir.name, 'apply.log')
+        self.applier.error_records_file = os.path.join(self.tmp_dir.name, 'batch_errors.ndjson')
+        self.applier._error_buffer = []
+        self.applier._error_lock = threading.Lock()
+        self.applier.logger = logging.getLogger('test_enhanced_batch_applier')
+        self.applier.ddb_client = boto3.client(
+            'dynamodb', region_name='us-west-2',
+            aws_access_key_id='testing', aws_secret_access_key='testing'
+        )
+        self.stubber = Stubber(self.applier.ddb_client)
+        self.stubber.activate()
+
+    def tearDown(self):
+        self.stubber.deactivate()
+        self.tmp_dir.cleanup()
+
+    def test_malformed_record_does_not_block_batch(self):
+        """10条记录中1条MODIFY缺少NewImage: 其余9条写入，异常记录写入错误文件"""
+        records = [make_record('INSERT', f'item-{n}') for n in range(10)]
+        records[4] = make_record('MODIFY', 'item-4', with_image=False)
+
+        expected_requests = [{'PutRequest': {'Item': r['dynamodb']['NewImage']}}
+                             for n, r in enumerate(records) if n != 4]
+        self.stubber.add_response(
+            'batch_write_item',
+            {'UnprocessedItems': {}},
+            {'RequestItems': {TABLE_NAME: expected_requests}}
+        )
+
+        self.assertFalse(self.applier.apply_records(records, 'test'))
+        self.stubber.assert_no_pending_responses()
+
+        with open(self.applier.error_records_file) as f:
+            error_records = [json.loads(line) for line in f]
+        self.assertEqual(len(error_records), 1)
+        self.assertEqual(error_records[0]['record_index'], 4)
+        self.assertEqual(error_records[0]['record_data'], records[4])
+
+if __name__ == '__main__':
+    unittest.main()